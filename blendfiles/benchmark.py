@@ -0,0 +1,442 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8-80 compliant>
+
+# Object node benchmark suite, see "Benchmarks" in source/evaluation.rst
+#
+# Usage:
+#   blender -b --python benchmark.py -- [--output FILE] [--frames N]
+#                                       [--max-size N] [--cache-dir DIR]
+#                                       [--max-cache-mb N]
+#
+# The node trees of the evaluation scenarios are built from the object node
+# mockups and evaluated over the frame range. There is no evaluator yet:
+# when no profiling statistics were recorded the scenario is skipped and no
+# record is written for it.
+#
+# The cache roundtrip is a raw layer I/O proxy: the attribute layers of
+# each scenario are generated as plain arrays, written and read back frame
+# by frame. It does not use the "Cache Components" node or a cache backend.
+
+import bpy
+import os
+import sys
+import time
+import json
+import argparse
+from array import array
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import object_nodes
+
+
+###############################################################################
+
+
+def new_tree(name):
+    return bpy.data.node_groups.new(name, 'ObjectNodeTree')
+
+
+def link_output(ntree, socket, output_node):
+    # dynamic socket lists keep one unconnected placeholder socket at the end
+    ntree.links.new(socket, output_node.inputs[-1])
+    output_node.update()
+
+
+def build_animation_deform(ntree):
+    nodes = ntree.nodes
+    links = ntree.links
+
+    components = nodes.new('ObjectComponentsNode')
+    components.outputs.new('ObjectComponentSocket', "Mesh")
+
+    deform = nodes.new('ArmatureDeformNode')
+    deform.armature = "Armature"
+    links.new(components.outputs["Mesh"], deform.inputs["Mesh"])
+
+    return deform.outputs["Mesh"]
+
+
+def build_particle_scatter(ntree):
+    nodes = ntree.nodes
+    links = ntree.links
+
+    create = nodes.new('CreateParticlesNode')
+    create.use_fixed_amount = True
+
+    sample = nodes.new('MeshSurfaceSampleNode')
+    sample.surface_object = "Emitter"
+
+    set_location = nodes.new('SetParticlesAttributeNode')
+    set_location.attributes = {'location'}
+    links.new(create.outputs["Particles"], set_location.inputs["Particles"])
+    links.new(sample.outputs["Point"], set_location.inputs["location"])
+
+    duplis = nodes.new('MakeObjectDuplisNode')
+    duplis.use_group = True
+    duplis.group = "Prototypes"
+    links.new(set_location.outputs["Particles"], duplis.inputs["Particles"])
+
+    return duplis.outputs["Instances"]
+
+
+def build_fracture_rigid_bodies(ntree):
+    nodes = ntree.nodes
+    links = ntree.links
+
+    components = nodes.new('ObjectComponentsNode')
+    components.outputs.new('ObjectComponentSocket', "Particles")
+    components.outputs.new('ObjectComponentSocket', "Fracture Mesh")
+
+    rigidbody = nodes.new('ObjectParticleRigidBodySimNodeNode')
+    links.new(components.outputs["Particles"],
+              rigidbody.inputs["Particles"])
+    links.new(components.outputs["Fracture Mesh"],
+              rigidbody.inputs["Fracture Mesh"])
+
+    fracture = nodes.new('ObjectDynamicFractureNodeNode')
+    links.new(rigidbody.outputs["RB Particles"], fracture.inputs["Particles"])
+    links.new(components.outputs["Fracture Mesh"],
+              fracture.inputs["Fracture Mesh"])
+
+    islands = nodes.new('ObjectApplyMeshIslandsTransformNode')
+    links.new(fracture.outputs["Particles"], islands.inputs["Particles"])
+    links.new(fracture.outputs["Fracture Mesh"],
+              islands.inputs["Fracture Mesh"])
+
+    return islands.outputs["Mesh"]
+
+
+# Scenarios:
+#   name, tree builder,
+#   per-element layers (name, typecode, components, changes per frame)
+_scenarios = [
+    ("animation_deform", build_animation_deform, [
+        ("vertex.location", 'f', 3, True),
+        ("weights.bone", 'i', 4, False),
+        ("weights.weight", 'f', 4, False),
+        ]),
+    ("particle_scatter", build_particle_scatter, [
+        ("id", 'i', 1, False),
+        ("location", 'f', 3, True),
+        ("rotation", 'f', 4, True),
+        ("prototype", 'i', 1, False),
+        ]),
+    ("fracture_rigid_bodies", build_fracture_rigid_bodies, [
+        ("id", 'i', 1, False),
+        ("transform", 'f', 12, True),
+        ("velocity", 'f', 3, True),
+        ("angular_velocity", 'f', 3, True),
+        ]),
+    ]
+
+
+def set_size(ntree, size):
+    for node in ntree.nodes:
+        if node.bl_idname == 'CreateParticlesNode':
+            node.inputs["Amount"].default_value = size
+
+
+def build_tree(name, builder, size):
+    ntree = new_tree("bench_%s" % name)
+    result = builder(ntree)
+
+    output = ntree.nodes.new('RenderGeometryOutputNode')
+    link_output(ntree, result, output)
+
+    set_size(ntree, size)
+    return ntree
+
+
+def make_layers(layers, size):
+    return [(name, array(typecode, [0]) * (size * components), changes)
+            for name, typecode, components, changes in layers]
+
+
+def frame_bytes(layers, size, frame):
+    """Size of the cached layers of a single frame"""
+    return sum(size * components * array(typecode).itemsize
+               for name, typecode, components, changes in layers
+               if frame == 0 or changes)
+
+
+###############################################################################
+
+
+# Peak memory is measured for each run on its own:
+# on Linux the peak resident size (VmHWM) can be reset through
+# /proc/self/clear_refs, elsewhere only the growth of the process lifetime
+# peak over the run is reported, which is a lower bound.
+
+_proc_status = "/proc/self/status"
+_proc_clear_refs = "/proc/self/clear_refs"
+
+
+def _read_vm_hwm():
+    try:
+        with open(_proc_status) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    # value in kB
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _maxrss_mb():
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return maxrss / (1024.0 * 1024.0)
+    return maxrss / 1024.0
+
+
+class PeakMemory:
+    def __init__(self):
+        self.use_hwm = False
+        self.baseline = None
+
+    def reset(self):
+        try:
+            with open(_proc_clear_refs, 'w') as f:
+                f.write("5")
+            self.use_hwm = _read_vm_hwm() is not None
+        except (IOError, OSError):
+            self.use_hwm = False
+        if not self.use_hwm:
+            self.baseline = _maxrss_mb()
+
+    def peak_mb(self):
+        if self.use_hwm:
+            return _read_vm_hwm()
+        peak = _maxrss_mb()
+        if peak is None or self.baseline is None:
+            return None
+        return peak - self.baseline
+
+
+###############################################################################
+
+
+def node_statistics(ntree, nodes):
+    """Add the statistics of the last evaluation to the node totals"""
+    for key, stats in object_nodes.profile_stats(ntree).items():
+        node_name = key[1]
+        entry = nodes.setdefault(node_name, {"time_ms": 0.0, "elements": 0})
+        entry["time_ms"] += stats["time"]
+        entry["elements"] += stats["elements"]
+
+
+def _evict(f):
+    """Drop the file from the OS page cache, so reading hits the disk"""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        return True
+    return False
+
+
+def cache_roundtrip(layers, frames, filepath):
+    """Write and read back the layers frame by frame.
+    Layers that don't change are only written for the first frame,
+    like unchanged topology. Only one frame exists on disk at a time.
+    Returns (bytes, write time, read time, cold read).
+    """
+    nbytes = 0
+    write_time = 0.0
+    read_time = 0.0
+    cold = True
+
+    for frame in range(frames):
+        frame_layers = [data for name, data, changes in layers
+                        if frame == 0 or changes]
+
+        start = time.perf_counter()
+        with open(filepath, 'wb') as f:
+            for data in frame_layers:
+                data.tofile(f)
+                nbytes += len(data) * data.itemsize
+            f.flush()
+            os.fsync(f.fileno())
+        write_time += time.perf_counter() - start
+
+        with open(filepath, 'rb') as f:
+            cold = _evict(f) and cold
+
+            start = time.perf_counter()
+            for data in frame_layers:
+                read = array(data.typecode)
+                read.fromfile(f, len(data))
+            read_time += time.perf_counter() - start
+
+        os.remove(filepath)
+
+    return nbytes, write_time, read_time, cold
+
+
+def make_record(scenario, size, frames, peak_memory):
+    return {
+        "scenario": scenario,
+        "size": size,
+        "frames": frames,
+        "blender_version": bpy.app.version_string,
+        "build_hash": bpy.app.build_hash.decode(),
+        "build_ms": None,
+        "throughput": None,
+        "peak_memory_mb": peak_memory.peak_mb(),
+        "cache_write_mbps": None,
+        "cache_read_mbps": None,
+        "nodes": {},
+        }
+
+
+def run_scenario(name, builder, size, frames):
+    """Evaluate a scenario tree over the frame range.
+    Returns None if the evaluator recorded no statistics.
+    """
+    peak_memory = PeakMemory()
+    peak_memory.reset()
+    object_nodes.profile_clear()
+
+    start = time.perf_counter()
+    ntree = build_tree(name, builder, size)
+    build_time = time.perf_counter() - start
+
+    scene = bpy.context.scene
+    nodes = dict()
+    for frame in range(scene.frame_start, scene.frame_start + frames):
+        scene.frame_set(frame)
+        node_statistics(ntree, nodes)
+    bpy.data.node_groups.remove(ntree)
+
+    if not nodes:
+        return None
+
+    total_time = sum(stats["time_ms"] for stats in nodes.values()) / 1000.0
+    record = make_record(name, size, frames, peak_memory)
+    record["build_ms"] = build_time * 1000.0
+    if total_time > 0.0:
+        record["throughput"] = size * frames / total_time
+    record["nodes"] = nodes
+    return record
+
+
+def run_cache_roundtrip(size, frames, cache_dir):
+    peak_memory = PeakMemory()
+    peak_memory.reset()
+
+    total_bytes = 0
+    write_time = 0.0
+    read_time = 0.0
+    cold = True
+    for name, builder, layers in _scenarios:
+        filepath = os.path.join(cache_dir, "bench_%s_%d.cache" % (name, size))
+
+        data = make_layers(layers, size)
+        nbytes, wtime, rtime, rcold = cache_roundtrip(data, frames, filepath)
+        del data
+
+        total_bytes += nbytes
+        write_time += wtime
+        read_time += rtime
+        cold = cold and rcold
+
+    megabytes = total_bytes / (1024.0 * 1024.0)
+    record = make_record("cache_roundtrip", size, frames, peak_memory)
+    record["cache_method"] = "raw_layer_io"
+    record["cache_read_cold"] = cold
+    record["throughput"] = \
+        len(_scenarios) * size * frames / (write_time + read_time)
+    record["cache_write_mbps"] = megabytes / write_time
+    record["cache_read_mbps"] = megabytes / read_time
+    return record
+
+
+###############################################################################
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="Object node benchmarks")
+    parser.add_argument("--output", default="object_nodes_benchmark.json",
+                        help="JSON file for the results")
+    parser.add_argument("--frames", type=int, default=10,
+                        help="Number of frames per run")
+    parser.add_argument("--max-size", type=float, default=1e7,
+                        help="Largest number of elements")
+    # the system temp directory is often RAM-backed (tmpfs),
+    # which would measure memory copies instead of disk I/O
+    parser.add_argument("--cache-dir", default=os.getcwd(),
+                        help="Directory for temporary cache files, "
+                             "should be on a real disk")
+    parser.add_argument("--max-cache-mb", type=float, default=1024.0,
+                        help="Largest cache frame written to disk, "
+                             "larger sizes skip the cache roundtrip")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    if not hasattr(bpy.types, "ObjectNodeTree"):
+        object_nodes.register()
+
+    sizes = []
+    size = 1000
+    while size <= args.max_size:
+        sizes.append(size)
+        size *= 10
+
+    records = []
+    for size in sizes:
+        for name, builder, layers in _scenarios:
+            record = run_scenario(name, builder, size, args.frames)
+            if record is None:
+                print("%s %d: skipped, no evaluator statistics"
+                      % (name, size))
+                continue
+            records.append(record)
+            print("%s %d: done" % (name, size))
+
+        max_frame_mb = max(frame_bytes(layers, size, 0)
+                           for name, builder, layers in _scenarios) \
+            / (1024.0 * 1024.0)
+        if max_frame_mb > args.max_cache_mb:
+            print("cache_roundtrip %d: skipped, %.0f MB per frame exceeds "
+                  "--max-cache-mb" % (size, max_frame_mb))
+            continue
+        records.append(run_cache_roundtrip(size, args.frames, args.cache_dir))
+        print("cache_roundtrip %d: done" % size)
+
+    with open(args.output, 'w') as f:
+        json.dump(records, f, indent=2)
+    print("Results written to %s" % args.output)
+
+
+if __name__ == "__main__":
+    main()
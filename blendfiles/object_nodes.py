@@ -30,7 +30,7 @@ bl_info = {
     'category': 'Development'}
 
 
-import bpy, nodeitems_utils, contextlib
+import bpy, nodeitems_utils, contextlib, json
 from bpy.types import Operator, NodeTree, Node, NodeSocket, PropertyGroup, Panel, UIList
 from bpy.props import *
 from nodeitems_utils import NodeCategory, NodeItem
@@ -169,6 +169,10 @@ class ObjectNodeTree(NodeTreeBase, NodeTree):
     bl_label = 'Object Nodes'
     bl_icon = 'OBJECT_DATA'
 
+    show_profiling = BoolProperty(name="Show Profiling",
+                                  description="Display evaluation statistics of nodes",
+                                  default=False)
+
     '''
     @classmethod
     def get_from_context(cls, context):
@@ -185,6 +189,71 @@ class ObjectNodeBase(NodeBase):
     def poll(cls, ntree):
         return ntree.bl_idname == 'ObjectNodeTree'
 
+    def draw_profiling(self, context, layout, eval_context='VIEWPORT'):
+        ob = context.object
+        key = (self.id_data.name, self.name, ob.name if ob else "", eval_context)
+        stats = _profile_stats.get(key, None)
+        col = layout.column(align=True)
+        if stats is None:
+            col.label("Not evaluated")
+            return
+        col.label("Time: %.3f ms" % stats["time"])
+        col.label("Elements: %d" % stats["elements"])
+        col.label("Memory: %.2f MB" % stats["memory"])
+        col.label("Cache: %s" % ("Hit" if stats["cache_hit"] else "Miss"))
+
+
+# Statistics of the last node evaluation.
+# These are runtime data like scene database entries, not stored in DNA,
+# keyed by (node tree, node, object, evaluation context) names.
+# Each entry is a dict with:
+#   start, time (ms), elements, memory (MB), cache_hit, thread
+_profile_stats = dict()
+_profile_eval_contexts = ('VIEWPORT', 'RENDER')
+
+def profile_record(ntree, node, ob, eval_context, **stats):
+    assert(eval_context in _profile_eval_contexts)
+    _profile_stats[(ntree.name, node.name, ob.name, eval_context)] = stats
+
+def profile_clear():
+    _profile_stats.clear()
+
+def profile_stats(ntree=None, node=None, ob=None, eval_context=None):
+    """Get recorded statistics, optionally filtered by tree, node, object and context"""
+    filters = (ntree.name if ntree else None,
+               node.name if node else None,
+               ob.name if ob else None,
+               eval_context)
+    return {key : stats for key, stats in _profile_stats.items()
+            if all(f is None or f == k for f, k in zip(filters, key))}
+
+def profile_trace_events(ntree=None):
+    """Convert recorded statistics into Chrome trace events"""
+    events = []
+    # name the "processes" after evaluation contexts,
+    # threads of parallel evaluation become tracks inside them
+    for pid, eval_context in enumerate(_profile_eval_contexts):
+        events.append({"name" : "process_name", "ph" : 'M', "pid" : pid,
+                       "args" : {"name" : eval_context}})
+
+    for (tree_name, node_name, ob_name, eval_context), stats in sorted(profile_stats(ntree).items()):
+        events.append({
+            "name" : node_name,
+            "cat" : tree_name,
+            "ph" : 'X',
+            "ts" : stats["start"] * 1000.0,
+            "dur" : stats["time"] * 1000.0,
+            "pid" : _profile_eval_contexts.index(eval_context),
+            "tid" : stats["thread"],
+            "args" : {
+                "object" : ob_name,
+                "elements" : stats["elements"],
+                "memory" : stats["memory"],
+                "cache_hit" : stats["cache_hit"],
+                },
+            })
+    return events
+
 
 ###############################################################################
 # Socket Types
@@ -206,6 +275,7 @@ class ObjectComponentSocket(NodeSocket):
     bl_label = 'Component'
 
     is_readonly = BoolProperty(name="Read Only",
+                               description="Node only reads the component, data is shared instead of copied",
                                default=False)
     is_placeholder = BoolProperty(name="Is Placeholder",
                                   default=False)
@@ -227,11 +297,15 @@ class ObjectComponentSocket(NodeSocket):
 
 # general-purpose list of component types and various associated strings:
 # identifier, UI name, description, socket type, icon, default name
+# NB: list position is the stored enum value, append new types at the end
 _component_types = [
     ('MESH', 'Mesh', 'Mesh data', 'ObjectComponentSocket', 'MESH_DATA', "Mesh"),
     ('FRACMESH', 'Fracture Mesh', 'Mesh with shard data', 'ObjectComponentSocket', 'MOD_TRIANGULATE', "FracMesh"),
     ('PARTICLES', 'Particles', 'Point data', 'ObjectComponentSocket', 'PARTICLE_DATA', "Particles"),
     ('POSE', 'Pose', 'Bone transformations pose', 'ObjectComponentSocket', 'POSE_DATA', "Pose"),
+    ('INSTANCES', 'Instances', 'Instance table of prototype objects', 'ObjectComponentSocket', 'OUTLINER_OB_GROUP_INSTANCE', "Instances"),
+    ('HAIR', 'Hair', 'Strand data', 'ObjectComponentSocket', 'HAIR', "Hair"),
+    ('VOLUME', 'Volume', 'Voxel grid data', 'ObjectComponentSocket', 'MOD_SMOKE', "Volume"),
     ]
 _component_types_set = { comp[0] for comp in _component_types }
 _component_items = [ (comp[0], comp[1], comp[2], comp[4], i) for i, comp in enumerate(_component_types) ]
@@ -519,6 +593,17 @@ class ValueColorNode(ObjectNodeBase, Node):
         self.outputs.new('NodeSocketColor', "Value")
 
 
+@object_node_item('Mockups')
+class TimeNode(ObjectNodeBase, Node):
+    '''Current evaluation time'''
+    bl_idname = 'ObjectTimeNode'
+    bl_label = 'Time'
+
+    def init(self, context):
+        self.outputs.new('NodeSocketFloat', "Frame")
+        self.outputs.new('NodeSocketFloat', "Time")
+
+
 @object_node_item('Mockups')
 class MathNode(ObjectNodeBase, Node):
     '''Math '''
@@ -747,6 +832,18 @@ class ViewportGeometryOutputNode(ObjectNodeBase, Node, DynamicSocketListNode):
     bl_idname = 'ViewportGeometryOutputNode'
     bl_label = 'Viewport Output'
 
+    use_simplify = BoolProperty(name="Simplify",
+                                description="Display decimated meshes in the viewport",
+                                default=False)
+    simplify_ratio = FloatProperty(name="Ratio",
+                                   description="Ratio of faces kept in decimated meshes",
+                                   default=0.25, min=0.0, max=1.0, subtype='FACTOR')
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "use_simplify")
+        if self.use_simplify:
+            layout.prop(self, "simplify_ratio")
+
     def dynamic_socket_append(self, socketlist):
         socket = socketlist.new("ObjectComponentSocket", "")
         socket.is_readonly = True
@@ -759,12 +856,22 @@ class ArmatureDeformNode(ObjectNodeBase, Node):
     bl_label = 'Armature Deform'
 
     armature = DummyIDRefProperty(name="Armature")
+    use_deform_preserve_volume = BoolProperty(name="Preserve Volume",
+                                              description="Deform rotation interpolation with quaternions",
+                                              default=False)
+    max_influences = IntProperty(name="Max Influences",
+                                 description="Maximum number of bones deforming a vertex",
+                                 default=4, min=1, max=8)
 
     def draw_buttons(self, context, layout):
         draw_dummy_id_ref(layout, self, "armature")
+        layout.prop(self, "use_deform_preserve_volume")
+        layout.prop(self, "max_influences")
 
     def init(self, context):
         self.inputs.new('ObjectComponentSocket', "Mesh")
+        # optional pose, e.g. from a cache, replaces the armature object pose
+        self.inputs.new('ObjectComponentSocket', "Pose").is_readonly = True
         self.outputs.new('ObjectComponentSocket', "Mesh")
 
 @object_node_item('Mockups')
@@ -802,9 +909,18 @@ class ImportComponentsNode(ObjectNodeBase, Node):
     bl_label = 'Import Components'
 
     cachefile = StringProperty(name="Cache File", subtype='FILE_PATH')
+    frame_offset = FloatProperty(name="Frame Offset",
+                                 description="Scene frame at which cache playback starts",
+                                 default=0.0)
+    time_scale = FloatProperty(name="Time Scale",
+                               description="Playback speed of the cache relative to the scene",
+                               default=1.0, min=0.01)
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "cachefile")
+        col = layout.column(align=True)
+        col.prop(self, "frame_offset")
+        col.prop(self, "time_scale")
 
     def draw_buttons_ext(self, context, layout):
         self.draw_buttons(context, layout)
@@ -887,11 +1003,15 @@ class CreateParticlesNode(ObjectNodeBase, Node):
                                      description="Use a variable rate instead of a frame range",
                                      default=False,
                                      update=_options_update)
+    viewport_percentage = IntProperty(name="Viewport Percentage",
+                                      description="Percentage of particles created for viewport display",
+                                      default=100, min=1, max=100, subtype='PERCENTAGE')
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "use_fixed_amount")
         if self.use_fixed_amount:
             layout.prop(self, "use_variable_rate")
+        layout.prop(self, "viewport_percentage")
 
     def init(self, context):
         amount = self.inputs.new('NodeSocketInt', "Amount")
@@ -938,6 +1058,8 @@ class JoinParticlesNode(ObjectNodeBase, Node, DynamicSocketListNode):
 
     def dynamic_socket_append(self, socketlist):
         socket = socketlist.new("ObjectComponentSocket", "")
+        # inputs are referenced as chunks of the joined set, not copied
+        socket.is_readonly = True
         return socket
 
 @object_node_item('Mockups')
@@ -946,11 +1068,35 @@ class SplitParticlesNode(ObjectNodeBase, Node):
     bl_label = 'Split Particles'
 
     def init(self, context):
-        self.inputs.new('ObjectComponentSocket', "Particles")
+        # outputs are index selections of the input particles
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
         self.inputs.new('NodeSocketInt', "Condition")
         self.outputs.new('ObjectComponentSocket', "True")
         self.outputs.new('ObjectComponentSocket', "False")
 
+@object_node_item('Mockups')
+class KillParticlesNode(ObjectNodeBase, Node):
+    '''Mark particles as dead based on a condition'''
+    bl_idname = 'KillParticlesNode'
+    bl_label = 'Kill Particles'
+
+    def init(self, context):
+        self.inputs.new('ObjectComponentSocket', "Particles")
+        self.inputs.new('NodeSocketInt', "Condition")
+        self.outputs.new('ObjectComponentSocket', "Particles")
+
+@object_node_item('Mockups')
+class FindParticleNode(ObjectNodeBase, Node):
+    '''Find the index of a particle by its id'''
+    bl_idname = 'FindParticleNode'
+    bl_label = 'Find Particle'
+
+    def init(self, context):
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
+        self.inputs.new('NodeSocketInt', "ID")
+        self.outputs.new('NodeSocketInt', "Index")
+        self.outputs.new('NodeSocketBool', "Found")
+
 @object_node_item('Mockups')
 class MeshSurfaceSampleNode(ObjectNodeBase, Node):
     '''Get random points on a mesh surface'''
@@ -1010,25 +1156,91 @@ class ParticleBillboardsNode(ObjectNodeBase, Node):
         layout.prop(self, "align")
 
     def init(self, context):
-        self.inputs.new('ObjectComponentSocket', "Particles")
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
+        size = self.inputs.new('NodeSocketFloat', "Size")
+        size.default_value = 0.1
+        self.outputs.new('ObjectComponentSocket', "Mesh")
+
+@object_node_item('Mockups')
+class ParticleSurfaceNode(ObjectNodeBase, Node):
+    '''Create a surface mesh from particles'''
+    bl_idname = 'ParticleSurfaceNode'
+    bl_label = 'Particle Surface'
+
+    voxel_size = FloatProperty(name="Voxel Size",
+                               description="Size of a single voxel of the distance field",
+                               default=0.05, min=0.0001, subtype='DISTANCE')
+    band_width = IntProperty(name="Band Width",
+                             description="Width of the narrow band around the surface in voxels",
+                             default=3, min=1)
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "voxel_size")
+        layout.prop(self, "band_width")
+
+    def init(self, context):
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
+        radius = self.inputs.new('NodeSocketFloat', "Radius")
+        radius.default_value = 0.1
         self.outputs.new('ObjectComponentSocket', "Mesh")
 
+@object_node_item('Mockups')
+class PointDensityNode(ObjectNodeBase, Node):
+    '''Create a density volume from particles'''
+    bl_idname = 'PointDensityNode'
+    bl_label = 'Point Density'
+
+    falloff = enum_property_copy(bpy.types.PointDensity, "falloff")
+    use_auto_resolution = BoolProperty(name="Auto Resolution",
+                                       description="Choose voxel size from the average particle spacing",
+                                       default=True)
+    voxel_size = FloatProperty(name="Voxel Size",
+                               description="Size of a single voxel",
+                               default=0.1, min=0.0001, subtype='DISTANCE')
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "falloff")
+        layout.prop(self, "use_auto_resolution")
+        if not self.use_auto_resolution:
+            layout.prop(self, "voxel_size")
+
+    def init(self, context):
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
+        radius = self.inputs.new('NodeSocketFloat', "Radius")
+        radius.default_value = 0.3
+        self.inputs.new('NodeSocketColor', "Color")
+        self.outputs.new('ObjectComponentSocket', "Volume")
+
 @object_node_item('Mockups')
 class MakeObjectDuplisNode(ObjectNodeBase, Node):
     '''Create object instances from particles'''
     bl_idname = 'MakeObjectDuplisNode'
     bl_label = 'Make Object Duplis'
 
+    def _options_update(self, context):
+        self.inputs["Prototype"].enabled = self.use_group
+    use_group = BoolProperty(name="Use Group",
+                             description="Instantiate objects of a group, selected by a prototype index",
+                             default=False,
+                             update=_options_update)
     object = DummyIDRefProperty(name="Object", description="Object to instantiate")
+    group = DummyIDRefProperty(name="Group", description="Group of prototype objects to instantiate")
 
     def draw_buttons(self, context, layout):
-        draw_dummy_id_ref(layout, self, "object")
+        layout.prop(self, "use_group")
+        if self.use_group:
+            draw_dummy_id_ref(layout, self, "group")
+        else:
+            draw_dummy_id_ref(layout, self, "object")
 
     def init(self, context):
-        self.inputs.new('ObjectComponentSocket', "Particles")
+        self.inputs.new('ObjectComponentSocket', "Particles").is_readonly = True
         self.inputs.new('TransformSocket', "Transform")
+        self.inputs.new('NodeSocketInt', "Prototype")
         self.outputs.new('ObjectComponentSocket', "Instances")
 
+        self._options_update(context)
+
 
 @object_node_item('Mockups')
 class HairSimNode(ObjectNodeBase, Node):
@@ -1036,10 +1248,54 @@ class HairSimNode(ObjectNodeBase, Node):
     bl_idname = 'HairSimNode'
     bl_label = 'Hair Simulation'
 
+    substeps = IntProperty(name="Substeps",
+                           description="Number of simulation steps per frame",
+                           default=5, min=1)
+    iterations = IntProperty(name="Iterations",
+                             description="Number of constraint iterations per step",
+                             default=4, min=1)
+
+    collision_distance = FloatProperty(name="Collision Distance",
+                                       description="Minimum distance of hair vertices to the collider surface",
+                                       default=0.005, min=0.0, subtype='DISTANCE')
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "substeps")
+        layout.prop(self, "iterations")
+        layout.prop(self, "collision_distance")
+
     def init(self, context):
         self.inputs.new('ObjectComponentSocket', "Hair")
+        self.inputs.new('ObjectComponentSocket', "Collider").is_readonly = True
         self.outputs.new('ObjectComponentSocket', "Hair")
 
+@object_node_item('Mockups')
+class SimulatePointsNode(ObjectNodeBase, Node):
+    '''Point mass simulation of particles'''
+    bl_idname = 'SimulatePointsNode'
+    bl_label = 'Simulate Points'
+
+    _integrator_items = [
+        ('EULER', 'Euler', 'Semi-implicit (symplectic) Euler integration', 'NONE', 0),
+        ('VERLET', 'Verlet', 'Position Verlet integration', 'NONE', 1),
+    ]
+    integrator = EnumProperty(name="Integrator",
+                              items=_integrator_items)
+    substeps = IntProperty(name="Substeps",
+                           description="Number of simulation steps per frame",
+                           default=1, min=1)
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "integrator")
+        layout.prop(self, "substeps")
+
+    def init(self, context):
+        self.inputs.new('ObjectComponentSocket', "Particles")
+        self.inputs.new('NodeSocketVector', "Force")
+        self.inputs.new('ObjectComponentSocket', "Collider").is_readonly = True
+        self.outputs.new('ObjectComponentSocket', "Particles")
+        self.outputs.new('NodeSocketInt', "Collided")
+
 @object_node_item('Mockups')
 class ApplyIslandTransformsNode(ObjectNodeBase, Node):
     '''Apply mesh island transforms from particles'''
@@ -1145,6 +1401,7 @@ _particle_attribute_set = [
     ("location", 'NodeSocketVector'),
     ("velocity", 'NodeSocketVector'),
     ("origin", 'NodeSocketVector'),
+    ("birth_time", 'NodeSocketFloat'),
     ]
 GetParticlesAttributeNode, SetParticlesAttributeNode = \
     make_attribute_nodes(_particle_attribute_set, 'location',
@@ -1288,6 +1545,63 @@ class ObjectNodeEdit(Operator):
         return {'FINISHED'}
 
 
+class ObjectNodeProfilingPanel(Panel):
+    bl_label = "Profiling"
+    bl_idname = "NODE_PT_object_nodes_profiling"
+    bl_space_type = 'NODE_EDITOR'
+    bl_region_type = 'UI'
+
+    @classmethod
+    def poll(cls, context):
+        space = context.space_data
+        return space.edit_tree and space.edit_tree.bl_idname == 'ObjectNodeTree'
+
+    def draw(self, context):
+        layout = self.layout
+        ntree = context.space_data.edit_tree
+
+        layout.prop(ntree, "show_profiling")
+        if not ntree.show_profiling:
+            return
+
+        node = context.active_node
+        if node and isinstance(node, ObjectNodeBase):
+            node.draw_profiling(context, layout)
+
+        layout.operator("object_nodes.export_profiling")
+
+
+class ObjectNodeExportProfiling(Operator):
+    """Write node evaluation statistics to a Chrome trace file"""
+    bl_idname = "object_nodes.export_profiling"
+    bl_label = "Export Trace"
+
+    filename_ext = ".json"
+    filter_glob = StringProperty(default="*.json", options={'HIDDEN'})
+    filepath = StringProperty(subtype='FILE_PATH')
+
+    @classmethod
+    def poll(cls, context):
+        space = context.space_data
+        return space.type == 'NODE_EDITOR' and space.edit_tree and space.edit_tree.bl_idname == 'ObjectNodeTree'
+
+    def execute(self, context):
+        if not self.filepath:
+            self.report({'ERROR'}, "No file path given")
+            return {'CANCELLED'}
+        filepath = bpy.path.ensure_ext(self.filepath, self.filename_ext)
+
+        ntree = context.space_data.edit_tree
+        events = profile_trace_events(ntree)
+        with open(filepath, 'w') as f:
+            json.dump({"traceEvents" : events}, f, indent=1)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
 ###############################################################################
 
 